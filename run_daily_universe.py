@@ -4,13 +4,32 @@ from src.utils import ensure_dirs, load_config, log
 from src.providers import USProvider, KoreaDailyProvider
 from src.universe_sources import fetch_sp500_symbols, fetch_kospi200_symbols
 from src.universe_builder import UniverseConfig, UniverseBuilder, save_watchlist
+from src.stores import ScreenCache, DailyBarStore
+from src.profiler import profiled, span
+import argparse
+import os
+import time
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true",
+                        help="프로파일링: collapsed-stack(.collapsed) + 요약(.txt) 저장")
+    parser.add_argument("--profile-out", default=None,
+                        help="프로파일 결과 경로 prefix (기본: data_dir/profile/daily_<시각>)")
+    parser.add_argument("--profile-top", type=int, default=20)
+    args = parser.parse_args()
+
     cfg = load_config("config.yaml")
     ensure_dirs(cfg)
 
-    us_symbols = fetch_sp500_symbols()
-    kr_symbols = fetch_kospi200_symbols()  # pykrx 필요
+    out = args.profile_out or os.path.join(cfg["paths"]["data_dir"], "profile", f"daily_{time.strftime('%Y%m%d_%H%M%S')}")
+    with profiled(args.profile, out, top_n=args.profile_top, logger=lambda m: log(cfg, m)):
+        run(cfg)
+
+def run(cfg):
+    with span("fetch_symbols"):
+        us_symbols = fetch_sp500_symbols()
+        kr_symbols = fetch_kospi200_symbols()  # pykrx 필요
 
     us_provider = USProvider()
     kr_provider = KoreaDailyProvider()
@@ -30,20 +49,50 @@ def main():
         top_n_kr=int(cfg["universe"]["top_n_kr"]),
     )
 
-    builder = UniverseBuilder(us_provider=us_provider, kr_provider=kr_provider)
+    # 종목별 스크리닝 결과 캐시: 데이터/설정 해시가 같으면 재계산 생략
+    cache_path = cfg["paths"].get("universe_cache", os.path.join(cfg["paths"]["data_dir"], "universe_cache.json"))
+    cache = ScreenCache(cache_path)
+    # 일봉 캐시: 오늘 받은 종목은 재수집 생략, 나머지는 빠진 날짜만 수집
+    bars_dir = cfg["paths"].get("universe_bars_dir", os.path.join(cfg["paths"]["data_dir"], "universe_bars"))
+    bars = DailyBarStore(bars_dir)
+
+    # 구성종목 수집이 실패(빈 목록)한 시장은 캐시를 건드리지 않음
+    if us_symbols:
+        cache.prune("US:", [f"US:{s}" for s in us_symbols])
+        bars.prune("US:", [f"US:{s}" for s in us_symbols])
+    if kr_symbols:
+        cache.prune("KR:", [f"KR:{s}" for s in kr_symbols])
+        bars.prune("KR:", [f"KR:{s}" for s in kr_symbols])
+
+    builder = UniverseBuilder(
+        us_provider=us_provider, kr_provider=kr_provider, cache=cache, bars=bars,
+        full_refresh_days=int(cfg["universe"].get("bars_full_refresh_days", 30)),
+    )
 
     log(cfg, f"[DAILY] Fetch symbols: US(SP500)={len(us_symbols)}, KR(KOSPI200)={len(kr_symbols)}")
 
     us_list = builder.build_us(us_symbols, uc)
-    save_watchlist(cfg["paths"]["watchlist_us"], us_list)
-    log(cfg, f"[DAILY] US watchlist saved: {cfg['paths']['watchlist_us']} (n={len(us_list)})")
+    with span("watchlist_save"):
+        us_delta = save_watchlist(cfg["paths"]["watchlist_us"], us_list, cfg["paths"].get("watchlist_us_delta"))
+    log(cfg, f"[DAILY] US watchlist saved: {cfg['paths']['watchlist_us']} (n={len(us_list)} "
+             f"added={len(us_delta['added'])} removed={len(us_delta['removed'])})")
 
     if kr_symbols:
         kr_list = builder.build_kr(kr_symbols, uc)
-        save_watchlist(cfg["paths"]["watchlist_kr"], kr_list)
-        log(cfg, f"[DAILY] KR watchlist saved: {cfg['paths']['watchlist_kr']} (n={len(kr_list)})")
+        with span("watchlist_save"):
+            kr_delta = save_watchlist(cfg["paths"]["watchlist_kr"], kr_list, cfg["paths"].get("watchlist_kr_delta"))
+        log(cfg, f"[DAILY] KR watchlist saved: {cfg['paths']['watchlist_kr']} (n={len(kr_list)} "
+                 f"added={len(kr_delta['added'])} removed={len(kr_delta['removed'])})")
     else:
         log(cfg, "[DAILY] KR symbols empty (pykrx missing or failed).")
 
+    with span("store_save"):
+        cache.save()
+        bars.save()
+    st = builder.stats
+    log(cfg, f"[DAILY] bars cached={st['bars_cached']} incremental={st['bars_incremental']} full={st['bars_full']} "
+             f"resync={st['bars_resync']} stale={st['bars_stale']} "
+             f"| screen cache hit={st['hit']} miss={st['miss']} | no_data={st['no_data']} rows_kept={st['rows_kept']}")
+
 if __name__ == "__main__":
     main()
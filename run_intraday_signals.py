@@ -1,70 +1,64 @@
-from src.utils import ensure_dirs, load_config, log, load_json
+import argparse
+import os
+import time
+from src.utils import ensure_dirs, load_config, log
 from src.providers import USProvider
+from src.bars import merge_ohlcv, overlap_ok
 from src.notifier import TelegramNotifier
 from src.trade_logic import evaluate_symbol
 from src.signals import TradeConfig
-from src.stores import PositionStore, StateStore
-
-def main():
-    cfg = load_config("config.yaml")
-    ensure_dirs(cfg)
-
-    # notifier에 logger 주입
-    notifier_cfg = cfg["notifier"]["telegram"]
-    notifier = TelegramNotifier(
-        enabled=bool(notifier_cfg.get("enabled", True)),
-        token_env=notifier_cfg.get("token_env", "TELEGRAM_BOT_TOKEN"),
-        chat_id_env=notifier_cfg.get("chat_id_env", "TELEGRAM_CHAT_ID"),
-        logger=lambda m: log(cfg, m),
-    )
-
-    # (선택) 실행될 때마다 “프로그램 살아있음” 로그 남기기
-    log(cfg, "[INTRADAY] runner started")
-
-    us_enabled = bool(cfg["intraday"]["market"]["us_enabled"])
+from src.stores import PositionStore, StateStore, WatchlistTracker
+from src.universe_builder import delta_path_for
+from src.profiler import profiled, span
+
+def fetch_bars(cfg, us_provider, sym, bars):
+    """
+    bars=None  -> 1회 실행: 매번 lookback 전체 수집
+    bars=dict  -> 루프 모드: 새 종목만 전체 수집(warm), 기존 종목은 최근 N일만 받아 이어붙임
+      - 최근 봉 수집 실패 -> 빈 DataFrame (1회 실행과 같이 "no data"로 skip)
+      - 캐시와 안 겹치거나(오래 멈췄음) 겹친 봉 가격이 다르면(수정주가) 전체 재수집
+    """
     interval = cfg["intraday"]["interval"]
     lookback_days = int(cfg["intraday"]["lookback_days"])
 
-    tcfg = TradeConfig(
-        interval=interval,
-        short_ma=int(cfg["strategy"]["short_ma"]),
-        long_ma=int(cfg["strategy"]["long_ma"]),
-        confirm_bars=int(cfg["strategy"]["confirm_bars"]),
-        use_death_cross=bool(cfg["sell"]["use_death_cross"]),
-        use_trailing_stop=bool(cfg["sell"]["use_trailing_stop"]),
-        trailing_pct=float(cfg["sell"]["trailing_pct"]),
-        use_atr_stop=bool(cfg["sell"]["use_atr_stop"]),
-        atr_n=int(cfg["sell"]["atr_n"]),
-        atr_k=float(cfg["sell"]["atr_k"]),
-        use_time_stop=bool(cfg["sell"]["use_time_stop"]),
-        max_hold_bars=int(cfg["sell"]["max_hold_bars"]),
-    )
-
-    pos_store = PositionStore(cfg["paths"]["positions"])
-    state = StateStore(cfg["paths"]["state"])
-    us_provider = USProvider()
-
-    us_watch = load_json(cfg["paths"]["watchlist_us"], default=[])
-
-    # watchlist 개수 로그
-    log(cfg, f"[INTRADAY] watchlist_us size={len(us_watch)} interval={interval} lookback_days={lookback_days}")
+    df = None
+    if bars is not None and sym in bars:
+        incremental_days = int(cfg["intraday"].get("incremental_days", 2))
+        recent = us_provider.fetch_ohlcv(sym, interval=interval, lookback_days=incremental_days)
+        if recent is None or recent.empty:
+            return recent
+        if overlap_ok(bars[sym], recent):
+            df = merge_ohlcv(bars[sym], recent, lookback_days)
+        else:
+            del bars[sym]
+
+    if df is None:
+        df = us_provider.fetch_ohlcv(sym, interval=interval, lookback_days=lookback_days)
+
+    if bars is not None and df is not None and not df.empty:
+        bars[sym] = df
+    return df
+
+def run_pass(cfg, symbols, tcfg, us_provider, notifier, pos_store, state, bars=None):
+    us_enabled = bool(cfg["intraday"]["market"]["us_enabled"])
 
     signals_sent = 0
     processed = 0
 
     if us_enabled:
-        for item in us_watch:
-            sym = item["symbol"]
+        for sym in symbols:
             processed += 1
 
-            df = us_provider.fetch_ohlcv(sym, interval=interval, lookback_days=lookback_days)
+            with span("fetch", sym):
+                df = fetch_bars(cfg, us_provider, sym, bars)
             if df is None or df.empty:
                 log(cfg, f"[INTRADAY] {sym}: no data")
                 continue
 
             key = f"US:{sym}"
             position = pos_store.get(key)
-            action, reason, new_pos = evaluate_symbol(df, tcfg, position)
+            with span("evaluate", sym):
+                action, reason, new_pos = evaluate_symbol(df, tcfg, position)
 
             bar_ts = str(df.index[-1])
 
@@ -82,7 +76,8 @@ def main():
                         f"- Reason: {reason}\n"
                         f"- MA{tcfg.short_ma}/{tcfg.long_ma}, {tcfg.interval}\n"
                     )
-                    ok = notifier.send(msg)
+                    with span("notify", sym):
+                        ok = notifier.send(msg)
                     log(cfg, f"[INTRADAY] {sym}: action={action} reason={reason} telegram_ok={ok}")
                     state.set_last_alert_ts(f"{key}:{action}", bar_ts)
                     signals_sent += 1
@@ -94,10 +89,102 @@ def main():
 
             pos_store.set(key, new_pos)
 
-    pos_store.save()
-    state.save()
+    with span("store_save"):
+        pos_store.save()
+        state.save()
 
-    log(cfg, f"[INTRADAY] runner finished processed={processed} signals_sent={signals_sent}")
+    return processed, signals_sent
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loop", type=int, default=0,
+                        help="N초마다 반복 실행 (0이면 1회 실행 후 종료)")
+    parser.add_argument("--profile", action="store_true",
+                        help="프로파일링: collapsed-stack(.collapsed) + 요약(.txt) 저장")
+    parser.add_argument("--profile-out", default=None,
+                        help="프로파일 결과 경로 prefix (기본: data_dir/profile/intraday_<시각>)")
+    parser.add_argument("--profile-top", type=int, default=20)
+    parser.add_argument("--profile-keep", type=int, default=10,
+                        help="--loop에서 최근 K개 패스의 프로파일 파일만 유지 (0이면 전부 유지)")
+    args = parser.parse_args()
+
+    cfg = load_config("config.yaml")
+    ensure_dirs(cfg)
+
+    out = args.profile_out or os.path.join(cfg["paths"]["data_dir"], "profile", f"intraday_{time.strftime('%Y%m%d_%H%M%S')}")
+    # 1회 실행은 전체를 한 번에, --loop는 run() 안에서 패스마다 따로 저장 (<out>_passN)
+    with profiled(args.profile and args.loop <= 0, out, top_n=args.profile_top, logger=lambda m: log(cfg, m)):
+        run(cfg, args, out)
+
+def run(cfg, args, profile_out):
+    # notifier에 logger 주입
+    notifier_cfg = cfg["notifier"]["telegram"]
+    notifier = TelegramNotifier(
+        enabled=bool(notifier_cfg.get("enabled", True)),
+        token_env=notifier_cfg.get("token_env", "TELEGRAM_BOT_TOKEN"),
+        chat_id_env=notifier_cfg.get("chat_id_env", "TELEGRAM_CHAT_ID"),
+        logger=lambda m: log(cfg, m),
+    )
+
+    # (선택) 실행될 때마다 “프로그램 살아있음” 로그 남기기
+    log(cfg, "[INTRADAY] runner started")
+
+    interval = cfg["intraday"]["interval"]
+    lookback_days = int(cfg["intraday"]["lookback_days"])
+
+    tcfg = TradeConfig(
+        interval=interval,
+        short_ma=int(cfg["strategy"]["short_ma"]),
+        long_ma=int(cfg["strategy"]["long_ma"]),
+        confirm_bars=int(cfg["strategy"]["confirm_bars"]),
+        use_death_cross=bool(cfg["sell"]["use_death_cross"]),
+        use_trailing_stop=bool(cfg["sell"]["use_trailing_stop"]),
+        trailing_pct=float(cfg["sell"]["trailing_pct"]),
+        use_atr_stop=bool(cfg["sell"]["use_atr_stop"]),
+        atr_n=int(cfg["sell"]["atr_n"]),
+        atr_k=float(cfg["sell"]["atr_k"]),
+        use_time_stop=bool(cfg["sell"]["use_time_stop"]),
+        max_hold_bars=int(cfg["sell"]["max_hold_bars"]),
+    )
+
+    pos_store = PositionStore(cfg["paths"]["positions"])
+    state = StateStore(cfg["paths"]["state"])
+    us_provider = USProvider()
+
+    watch_path = cfg["paths"]["watchlist_us"]
+    watch = WatchlistTracker(watch_path, cfg["paths"].get("watchlist_us_delta", delta_path_for(watch_path)))
+
+    # watchlist 개수 로그
+    log(cfg, f"[INTRADAY] watchlist_us size={len(watch.symbols())} interval={interval} lookback_days={lookback_days}")
+
+    if args.loop <= 0:
+        processed, signals_sent = run_pass(cfg, watch.symbols(), tcfg, us_provider, notifier, pos_store, state)
+        log(cfg, f"[INTRADAY] runner finished processed={processed} signals_sent={signals_sent}")
+    else:
+        # 루프 모드: 종목별 봉 캐시 유지, watchlist delta는 재시작 없이 반영
+        bars = {}
+        n_pass = 0
+        while True:
+            n_pass += 1
+            added, removed = watch.refresh()
+            if added or removed:
+                for sym in removed:
+                    bars.pop(sym, None)
+                log(cfg, f"[INTRADAY] watchlist delta applied: added={len(added)} removed={len(removed)} "
+                         f"size={len(watch.symbols())}")
+
+            with profiled(args.profile, f"{profile_out}_pass{n_pass}", top_n=args.profile_top,
+                          logger=lambda m: log(cfg, m)):
+                processed, signals_sent = run_pass(cfg, watch.symbols(), tcfg, us_provider, notifier,
+                                                   pos_store, state, bars=bars)
+            if args.profile and 0 < args.profile_keep < n_pass:
+                # 최근 K개 패스만 남김 (루프가 하루 종일 돌아도 파일 수 고정)
+                for ext in (".collapsed", ".txt"):
+                    old = f"{profile_out}_pass{n_pass - args.profile_keep}{ext}"
+                    if os.path.exists(old):
+                        os.remove(old)
+            log(cfg, f"[INTRADAY] pass finished processed={processed} signals_sent={signals_sent}")
+            time.sleep(args.loop)
 
     # ✅ 신호가 0개여도 “살아있음”을 텔레그램으로 받고 싶으면 아래 2줄 주석 해제
     # if signals_sent == 0:
@@ -0,0 +1,46 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+# 캐시된 봉과 새로 받은 봉을 잇는 헬퍼 (provider/네트워크 의존 없음)
+
+def trim_ohlcv(df: pd.DataFrame, lookback_days: int) -> pd.DataFrame:
+    # 마지막 봉 기준 lookback_days 이전 봉은 잘라냄
+    if df is None or df.empty:
+        return df
+    cutoff = df.index[-1] - pd.Timedelta(days=lookback_days)
+    return df[df.index >= cutoff]
+
+def overlap_ok(old: pd.DataFrame, new: pd.DataFrame, rtol: float = 0.005) -> bool:
+    """
+    old 뒤에 new를 이어붙여도 되는지 확인
+    - new가 old 마지막 봉 이전부터 시작해야 함 (사이에 빈 구간 없음)
+    - 겹치는 봉의 Close가 rtol 이내로 같아야 함 (액면분할/수정주가 반영되면 과거 가격이 바뀜)
+    - old 마지막 봉은 장중에 받은 미완성 봉일 수 있어 비교에서 제외
+    """
+    if old is None or old.empty or new is None or new.empty:
+        return False
+    if new.index[0] > old.index[-1]:
+        return False
+    common = old.index.intersection(new.index)
+    common = common[common < old.index[-1]]
+    if len(common) == 0:
+        return False
+    a = old.loc[common, "Close"].astype(float).to_numpy()
+    b = new.loc[common, "Close"].astype(float).to_numpy()
+    return bool(np.allclose(a, b, rtol=rtol, atol=0.0))
+
+def merge_ohlcv(old: pd.DataFrame, new: pd.DataFrame, lookback_days: int) -> pd.DataFrame:
+    """
+    캐시된 봉(old)에 최근 봉(new)을 이어붙임
+    - 같은 시각 봉은 새 것으로 덮어씀 (진행 중이던 마지막 봉 갱신)
+    - lookback_days 이전 봉은 잘라냄
+    - 이어붙여도 되는지는 호출 쪽에서 overlap_ok()로 먼저 확인
+    """
+    if old is None or old.empty:
+        return trim_ohlcv(new, lookback_days)
+    if new is None or new.empty:
+        return trim_ohlcv(old, lookback_days)
+    out = pd.concat([old, new])
+    out = out[~out.index.duplicated(keep="last")].sort_index()
+    return trim_ohlcv(out, lookback_days)
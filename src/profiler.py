@@ -0,0 +1,190 @@
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 꺼져 있을 때 span()이 돌려주는 공용 no-op 컨텍스트 (할당/기록 없음)
+_NULL_SPAN = nullcontext()
+_active: Optional["Profiler"] = None
+
+def span(stage: str, symbol: Optional[str] = None):
+    """
+    구간 태그 (fetch / cross_up / cross_down / atr / store_save / notify ...)
+    - 프로파일러가 꺼져 있으면 아무 것도 하지 않음
+    - symbol은 바깥 span에서 한 번만 주면 안쪽 span에도 이어짐
+    """
+    if _active is None:
+        return _NULL_SPAN
+    return _Span(_active, stage, symbol)
+
+class _Span:
+    __slots__ = ("prof", "stage", "symbol", "t0", "n_tags")
+
+    def __init__(self, prof: "Profiler", stage: str, symbol: Optional[str]):
+        self.prof = prof
+        self.stage = stage
+        self.symbol = symbol
+
+    def __enter__(self):
+        tags = self.prof.tags
+        self.n_tags = len(tags)
+        if self.symbol is not None:
+            tags.append(f"sym:{self.symbol}")
+        tags.append(f"stage:{self.stage}")
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        p = self.prof
+        del p.tags[self.n_tags:]
+        p.stage_time[self.stage] += dt
+        p.stage_calls[self.stage] += 1
+        if self.symbol is not None:
+            p.symbol_time[self.symbol] += dt
+        return False
+
+class Profiler:
+    """
+    샘플링 프로파일러 (메인 스레드 스택을 interval마다 수집)
+    - 샘플마다 직전 샘플 이후 실제 경과 시간으로 가중
+      (CPU 작업 중에는 GIL 때문에 샘플이 늦게 잡히므로 횟수로 세면 I/O 쪽으로 치우침)
+    - 스택 앞에 span 태그(sym:/stage:)를 붙여 collapsed-stack(값=마이크로초)으로 저장
+      -> flamegraph.pl / speedscope / inferno 등에서 바로 렌더링
+    - span 구간별 wall time 합계는 별도로 기록 (요약 리포트용)
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.tags: List[str] = []
+        self.samples: Dict[str, float] = defaultdict(float)  # stack -> 누적 초
+        self.n_samples = 0
+        self.stage_time: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Counter = Counter()
+        self.symbol_time: Dict[str, float] = defaultdict(float)
+        self.wall = 0.0
+        self._t0 = 0.0
+        self._tid: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        global _active
+        self._tid = threading.get_ident()
+        self._stop.clear()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+        _active = self
+
+    def stop(self):
+        global _active
+        _active = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.wall = time.perf_counter() - self._t0
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            frame = sys._current_frames().get(self._tid)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            tags = list(self.tags)
+            key = ";".join(tags + stack)
+            self.samples[key] += weight
+            self.n_samples += 1
+
+    def hotspots(self, top_n: int = 20) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+        """(self 시간 상위, inclusive 시간 상위) 함수 목록"""
+        self_cnt: Counter = Counter()
+        incl_cnt: Counter = Counter()
+        for key, n in self.samples.items():
+            frames = [f for f in key.split(";") if not f.startswith(("sym:", "stage:"))]
+            if not frames:
+                continue
+            self_cnt[frames[-1]] += n
+            for f in set(frames):
+                incl_cnt[f] += n
+        return self_cnt.most_common(top_n), incl_cnt.most_common(top_n)
+
+    def summary(self, top_n: int = 20) -> str:
+        sampled = sum(self.samples.values())
+        total = sampled or 1
+        lines = [f"wall={self.wall:.3f}s sampled={sampled:.3f}s samples={self.n_samples} "
+                 f"interval={self.interval * 1000:.1f}ms", ""]
+
+        lines.append("[stages] (wall time, span 중첩 시 바깥 span에 안쪽 시간 포함)")
+        for stage, t in sorted(self.stage_time.items(), key=lambda x: -x[1]):
+            lines.append(f"  {t:9.3f}s  calls={self.stage_calls[stage]:<6d} {stage}")
+
+        lines.append("")
+        lines.append(f"[symbols] top {top_n} by wall time")
+        for sym, t in sorted(self.symbol_time.items(), key=lambda x: -x[1])[:top_n]:
+            lines.append(f"  {t:9.3f}s  {sym}")
+
+        self_top, incl_top = self.hotspots(top_n)
+        lines.append("")
+        lines.append(f"[hotspots] top {top_n} by self time")
+        for f, t in self_top:
+            lines.append(f"  {t / total * 100:6.2f}%  {t:9.3f}s  {f}")
+        lines.append("")
+        lines.append(f"[hotspots] top {top_n} by inclusive time")
+        for f, t in incl_top:
+            lines.append(f"  {t / total * 100:6.2f}%  {t:9.3f}s  {f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_prefix: str, top_n: int = 20) -> Tuple[str, str]:
+        """<prefix>.collapsed (flame graph 입력) + <prefix>.txt (요약) 저장"""
+        d = os.path.dirname(out_prefix)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        collapsed_path = f"{out_prefix}.collapsed"
+        summary_path = f"{out_prefix}.txt"
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for key, t in sorted(self.samples.items()):
+                us = int(round(t * 1e6))
+                if us > 0:
+                    f.write(f"{key} {us}\n")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(self.summary(top_n))
+        return collapsed_path, summary_path
+
+@contextmanager
+def profiled(enabled: bool, out_prefix: str, top_n: int = 20,
+             logger: Optional[Callable[[str], None]] = None, interval: float = 0.005):
+    """
+    러너 전체를 감싸는 용도
+    - enabled=False면 프로파일러를 만들지 않음 (span()은 전부 no-op)
+    - 종료(예외/Ctrl+C 포함) 시 결과 파일 저장
+    """
+    if not enabled:
+        yield None
+        return
+
+    prof = Profiler(interval=interval)
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        collapsed_path, summary_path = prof.write(out_prefix, top_n)
+        msg = f"[PROFILE] saved: {collapsed_path}, {summary_path} (wall={prof.wall:.3f}s)"
+        if logger:
+            logger(msg)
+        else:
+            print(msg)
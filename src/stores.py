@@ -1,6 +1,7 @@
 import json
 from pathlib import Path
-from typing import Dict, Any
+import pandas as pd
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
 class PositionStore:
     def __init__(self, path: str):
@@ -49,3 +50,150 @@ class StateStore:
 
     def set_last_alert_ts(self, key: str, ts: str):
         self.state[key] = ts
+
+class ScreenCache:
+    """
+    유니버스 스크리닝 결과 캐시 (종목별)
+    - key: "US:AAPL" / "KR:005930"
+    - value: {"data_hash", "cfg_hash", "row"}  (row=None이면 필터 탈락)
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+        else:
+            self.entries = {}
+
+    def save(self):
+        self.path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def set(self, key: str, data: Dict[str, Any]):
+        self.entries[key] = data
+
+    def prune(self, prefix: str, keep: Iterable[str]):
+        # 지수 구성에서 빠진 종목은 캐시에서도 제거 (해당 시장 prefix만)
+        keep = set(keep)
+        self.entries = {k: v for k, v in self.entries.items() if not k.startswith(prefix) or k in keep}
+
+class DailyBarStore:
+    """
+    유니버스용 일봉 캐시 (종목별 pickle + index.json)
+    - index: key -> {"last_bar", "fetched_on", "full_fetched_on", "lookback_days"}
+    - 오늘 이미 받은 종목은 네트워크 생략, 아니면 last_bar 이후만 받아 이어붙임
+    """
+    def __init__(self, dir_path: str):
+        self.dir = Path(dir_path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / "index.json"
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        if self.index_path.exists():
+            try:
+                self.index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except Exception:
+                self.index = {}
+        else:
+            self.index = {}
+
+    def save(self):
+        self.index_path.write_text(json.dumps(self.index, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def _file(self, key: str) -> Path:
+        return self.dir / f"{key.replace(':', '_')}.pkl"
+
+    def meta(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(key)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        if key not in self.index:
+            return None
+        try:
+            return pd.read_pickle(self._file(key))
+        except Exception:
+            return None
+
+    def set(self, key: str, df: pd.DataFrame, fetched_on: str, lookback_days: int, full_fetched_on: str):
+        df.to_pickle(self._file(key))
+        self.index[key] = {
+            "last_bar": df.index[-1].strftime("%Y-%m-%d"),
+            "fetched_on": fetched_on,
+            "full_fetched_on": full_fetched_on,
+            "lookback_days": lookback_days,
+        }
+
+    def prune(self, prefix: str, keep: Iterable[str]):
+        keep = set(keep)
+        for key in [k for k in self.index if k.startswith(prefix) and k not in keep]:
+            del self.index[key]
+            try:
+                self._file(key).unlink()
+            except FileNotFoundError:
+                pass
+
+class WatchlistTracker:
+    """
+    watchlist 전체 목록 + delta 파일을 따라가며 현재 감시 종목을 유지
+    - 재시작 없이 refresh()로 추가/제거만 반영
+    - delta의 base_version이 내 version과 다르면(중간 delta를 놓침) 전체 목록 다시 로드
+    """
+    def __init__(self, path: str, delta_path: str):
+        self.path = Path(path)
+        self.delta_path = Path(delta_path)
+        self.version: Optional[str] = None
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.reload()
+
+    def _read(self, path: Path, default):
+        if not path.exists():
+            return default
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            return default
+
+    def symbols(self) -> List[str]:
+        return list(self.items.keys())
+
+    def reload(self) -> Tuple[List[str], List[str]]:
+        before = set(self.items)
+        delta = self._read(self.delta_path, {})
+        full = self._read(self.path, None)
+        if full is None:
+            # 목록을 못 읽으면(없음/깨짐) 지금 목록과 version을 그대로 유지 -> 다음 refresh에서 재시도
+            return [], []
+        self.items = {x["symbol"]: x for x in full}
+        self.version = delta.get("version")
+        after = set(self.items)
+        return [s for s in self.items if s not in before], sorted(before - after)
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """변경이 있으면 반영하고 (added, removed) 심볼 목록 반환"""
+        delta = self._read(self.delta_path, {})
+        version = delta.get("version")
+        if not version or version == self.version:
+            return [], []
+        if delta.get("base_version") != self.version:
+            return self.reload()
+
+        added = []
+        for x in delta.get("added", []):
+            if x["symbol"] not in self.items:
+                added.append(x["symbol"])
+            self.items[x["symbol"]] = x
+        removed = [s for s in delta.get("removed", []) if s in self.items]
+        for s in removed:
+            del self.items[s]
+        self.version = version
+        return added, removed
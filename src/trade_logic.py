@@ -3,6 +3,7 @@ from typing import Tuple, Dict, Any
 import numpy as np
 import pandas as pd
 from .signals import TradeConfig, cross_up, cross_down, atr
+from .profiler import span
 
 def evaluate_symbol(df: pd.DataFrame, cfg: TradeConfig, position: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
     if df is None or df.empty:
@@ -15,7 +16,9 @@ def evaluate_symbol(df: pd.DataFrame, cfg: TradeConfig, position: Dict[str, Any]
 
     # BUY
     if not in_pos:
-        if cross_up(df, cfg):
+        with span("cross_up"):
+            is_cross_up = cross_up(df, cfg)
+        if is_cross_up:
             new_pos = {
                 "in_position": True,
                 "entry_price": last_close,
@@ -33,15 +36,19 @@ def evaluate_symbol(df: pd.DataFrame, cfg: TradeConfig, position: Dict[str, Any]
 
     triggers = []
 
-    if cfg.use_death_cross and cross_down(df, cfg):
-        triggers.append("death_cross")
+    if cfg.use_death_cross:
+        with span("cross_down"):
+            is_cross_down = cross_down(df, cfg)
+        if is_cross_down:
+            triggers.append("death_cross")
 
     if cfg.use_trailing_stop:
         if last_close <= peak * (1.0 - cfg.trailing_pct):
             triggers.append(f"trailing_stop({cfg.trailing_pct*100:.1f}%)")
 
     if cfg.use_atr_stop:
-        a = atr(df, cfg.atr_n)
+        with span("atr"):
+            a = atr(df, cfg.atr_n)
         if a is not None and not a.empty and not np.isnan(a.iloc[-1]):
             stop_price = float(position["entry_price"]) - cfg.atr_k * float(a.iloc[-1])
             if last_close <= stop_price:
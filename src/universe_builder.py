@@ -1,9 +1,15 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, asdict
+from datetime import date, datetime
+from typing import List, Dict, Optional
+import hashlib
 import json
+import os
+import tempfile
 import numpy as np
 import pandas as pd
+from .profiler import span
+from .bars import merge_ohlcv, overlap_ok, trim_ohlcv
 
 def sma(s: pd.Series, n: int) -> pd.Series:
     return s.rolling(n, min_periods=n).mean()
@@ -37,112 +43,237 @@ class UniverseConfig:
     trend_ma: int = 200
     use_50_200_filter: bool = True
 
+def config_hash(cfg: UniverseConfig) -> str:
+    # top_n은 종목별 스크리닝 결과에 영향이 없으므로 제외 (순위만 다시 자르면 됨)
+    d = asdict(cfg)
+    d.pop("top_n_us", None)
+    d.pop("top_n_kr", None)
+    raw = json.dumps(d, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+def data_hash(df: pd.DataFrame) -> str:
+    h = pd.util.hash_pandas_object(df, index=True).values
+    return hashlib.sha1(h.tobytes()).hexdigest()
+
+def screen_symbol(df: pd.DataFrame, cfg: UniverseConfig, min_price: float, min_liquidity: float) -> Optional[Dict]:
+    """
+    종목 1개 스크리닝 (유동성 -> 추세 -> 모멘텀)
+    - 통과하면 점수 row, 탈락하면 None
+    """
+    if df is None or df.empty or len(df) < cfg.trend_ma + 60:
+        return None
+
+    c = df["Close"].astype(float)
+    v = df["Volume"].astype(float)
+
+    price = float(c.iloc[-1])
+    if price < min_price:
+        return None
+
+    # US는 달러거래대금, KR은 거래대금이 없으니 Close*Volume로 근사
+    liquidity = (c * v).rolling(cfg.dollar_vol_ma, min_periods=cfg.dollar_vol_ma).mean()
+    liq = float(liquidity.iloc[-1]) if len(liquidity) else 0.0
+    if liq < min_liquidity:
+        return None
+
+    ma200 = sma(c, cfg.trend_ma)
+    if np.isnan(ma200.iloc[-1]) or not (c.iloc[-1] > ma200.iloc[-1]):
+        return None
+
+    if cfg.use_50_200_filter:
+        ma50 = sma(c, 50)
+        if np.isnan(ma50.iloc[-1]) or not (ma50.iloc[-1] > ma200.iloc[-1]):
+            return None
+
+    r126 = ret_n(c, 126)
+    r63 = ret_n(c, 63)
+    if np.isnan(r126) or np.isnan(r63):
+        return None
+
+    score = cfg.mom_w_126 * r126 + cfg.mom_w_63 * r63
+
+    return {
+        "price": price,
+        "liquidity": liq,
+        "ret_126": r126,
+        "ret_63": r63,
+        "score": score,
+    }
+
 class UniverseBuilder:
-    def __init__(self, us_provider, kr_provider):
+    def __init__(self, us_provider, kr_provider, cache=None, bars=None, full_refresh_days: int = 30):
         self.us_provider = us_provider
         self.kr_provider = kr_provider
+        self.cache = cache  # ScreenCache (선택). 없으면 매번 전부 재계산
+        self.bars = bars    # DailyBarStore (선택). 없으면 매번 lookback 전체 수집
+        self.full_refresh_days = full_refresh_days  # 이 기간이 지나면 증분 대신 전체 재수집
+        self.stats = {"hit": 0, "miss": 0, "bars_cached": 0, "bars_incremental": 0,
+                      "bars_full": 0, "bars_resync": 0, "bars_stale": 0, "no_data": 0, "rows_kept": 0}
 
-    def build_us(self, symbols: List[str], cfg: UniverseConfig) -> List[Dict]:
-        rows = []
-        for sym in symbols:
-            df = self.us_provider.fetch_ohlcv(sym, interval="1d", lookback_days=cfg.lookback_days)
-            if df is None or df.empty or len(df) < cfg.trend_ma + 60:
-                continue
+    def _load_bars(self, key: str, provider, sym: str, cfg: UniverseConfig) -> pd.DataFrame:
+        """
+        일봉 확보
+        - 오늘 이미 받은 종목: 네트워크 없이 저장된 봉 사용
+        - 저장된 봉이 있으면 last_bar 이후만 받아 이어붙임
+          겹치는 봉 가격이 다르면(액면분할/수정주가) 저장된 봉을 버리고 전체 재수집
+        - 마지막 전체 수집 후 full_refresh_days가 지나면 전체 재수집
+        - 수집 실패 시 저장된 봉(어제 것)을 그대로 사용, fetched_on은 갱신하지 않음 -> 재실행 때 다시 시도
+        """
+        if self.bars is None:
+            with span("fetch", sym):
+                df = provider.fetch_ohlcv(sym, interval="1d", lookback_days=cfg.lookback_days)
+            self.stats["bars_full"] += 1
+            return df
 
-            c = df["Close"].astype(float)
-            v = df["Volume"].astype(float)
+        today = date.today()
+        meta = self.bars.meta(key)
+        old = None
+        if meta is not None and int(meta.get("lookback_days", 0)) >= cfg.lookback_days:
+            old = self.bars.get(key)
 
-            price = float(c.iloc[-1])
-            if price < cfg.min_price_us:
-                continue
+        df = None
+        if old is not None and not old.empty:
+            if meta.get("fetched_on") == today.isoformat():
+                self.stats["bars_cached"] += 1
+                return trim_ohlcv(old, cfg.lookback_days)
 
-            dollar_vol = (c * v).rolling(cfg.dollar_vol_ma, min_periods=cfg.dollar_vol_ma).mean()
-            dv = float(dollar_vol.iloc[-1]) if len(dollar_vol) else 0.0
-            if dv < cfg.min_dollar_vol_us:
-                continue
+            full_on = meta.get("full_fetched_on")
+            if full_on and (today - date.fromisoformat(full_on)).days < self.full_refresh_days:
+                # 주말/휴일 + 마지막 봉 갱신(장중에 받았던 봉)을 위해 며칠 겹치게 받음
+                days = (today - date.fromisoformat(meta["last_bar"])).days + 5
+                with span("fetch", sym):
+                    recent = provider.fetch_ohlcv(sym, interval="1d", lookback_days=days)
+                if recent is None or recent.empty:
+                    self.stats["bars_stale"] += 1
+                    return trim_ohlcv(old, cfg.lookback_days)
+                if overlap_ok(old, recent):
+                    df = merge_ohlcv(old, recent, cfg.lookback_days)
+                    self.stats["bars_incremental"] += 1
+                    full_on_new = full_on
+                else:
+                    self.stats["bars_resync"] += 1
 
-            ma200 = sma(c, cfg.trend_ma)
-            if np.isnan(ma200.iloc[-1]) or not (c.iloc[-1] > ma200.iloc[-1]):
-                continue
+        if df is None:
+            with span("fetch", sym):
+                df = provider.fetch_ohlcv(sym, interval="1d", lookback_days=cfg.lookback_days)
+            if df is None or df.empty:
+                if old is not None and not old.empty:
+                    self.stats["bars_stale"] += 1
+                    return trim_ohlcv(old, cfg.lookback_days)
+                return pd.DataFrame()
+            self.stats["bars_full"] += 1
+            full_on_new = today.isoformat()
+
+        self.bars.set(key, df, today.isoformat(), cfg.lookback_days, full_on_new)
+        return df
 
-            if cfg.use_50_200_filter:
-                ma50 = sma(c, 50)
-                if np.isnan(ma50.iloc[-1]) or not (ma50.iloc[-1] > ma200.iloc[-1]):
-                    continue
+    def _screen_all(self, market: str, provider, symbols: List[str], cfg: UniverseConfig,
+                    min_price: float, min_liquidity: float, source: str) -> List[Dict]:
+        cfg_h = config_hash(cfg)
+        rows = []
+        for sym in symbols:
+            key = f"{market}:{sym}"
+            entry = self.cache.get(key) if self.cache is not None else None
 
-            r126 = ret_n(c, 126)
-            r63 = ret_n(c, 63)
-            if np.isnan(r126) or np.isnan(r63):
+            df = self._load_bars(key, provider, sym, cfg)
+            if df is None or df.empty:
+                # 수집 실패: 직전 스크리닝 결과가 있으면 유지 (watchlist delta에서 removed로 튀지 않게)
+                self.stats["no_data"] += 1
+                if entry is not None and entry.get("row") is not None:
+                    self.stats["rows_kept"] += 1
+                    rows.append({"symbol": sym, **entry["row"], "source": source})
                 continue
 
-            score = cfg.mom_w_126 * r126 + cfg.mom_w_63 * r63
+            with span("hash", sym):
+                data_h = data_hash(df)
 
-            rows.append({
-                "symbol": sym,
-                "price": price,
-                "liquidity": dv,
-                "ret_126": r126,
-                "ret_63": r63,
-                "score": score,
-                "source": "SP500",
-            })
+            if entry is not None and entry.get("data_hash") == data_h and entry.get("cfg_hash") == cfg_h:
+                row = entry.get("row")
+                self.stats["hit"] += 1
+            else:
+                with span("screen", sym):
+                    row = screen_symbol(df, cfg, min_price, min_liquidity)
+                self.stats["miss"] += 1
+                if self.cache is not None:
+                    self.cache.set(key, {"data_hash": data_h, "cfg_hash": cfg_h, "row": row})
 
+            if row is None:
+                continue
+            rows.append({"symbol": sym, **row, "source": source})
+        return rows
+
+    def build_us(self, symbols: List[str], cfg: UniverseConfig) -> List[Dict]:
+        rows = self._screen_all("US", self.us_provider, symbols, cfg,
+                                cfg.min_price_us, cfg.min_dollar_vol_us, "SP500")
         if not rows:
             return []
         out = pd.DataFrame(rows).sort_values(["score", "liquidity"], ascending=[False, False]).head(cfg.top_n_us)
         return out.to_dict(orient="records")
 
     def build_kr(self, symbols: List[str], cfg: UniverseConfig) -> List[Dict]:
-        rows = []
-        for sym in symbols:
-            df = self.kr_provider.fetch_ohlcv(sym, interval="1d", lookback_days=cfg.lookback_days)
-            if df is None or df.empty or len(df) < cfg.trend_ma + 60:
-                continue
-
-            c = df["Close"].astype(float)
-            v = df["Volume"].astype(float)
-
-            price = float(c.iloc[-1])
-            if price < cfg.min_price_kr:
-                continue
+        rows = self._screen_all("KR", self.kr_provider, symbols, cfg,
+                                cfg.min_price_kr, cfg.min_value_traded_kr, "KOSPI200")
+        if not rows:
+            return []
+        out = pd.DataFrame(rows).sort_values(["score", "liquidity"], ascending=[False, False]).head(cfg.top_n_kr)
+        return out.to_dict(orient="records")
 
-            # KR 유동성: 거래대금이 없으니 Close*Volume로 근사
-            value_traded = (c * v).rolling(cfg.dollar_vol_ma, min_periods=cfg.dollar_vol_ma).mean()
-            vt = float(value_traded.iloc[-1]) if len(value_traded) else 0.0
-            if vt < cfg.min_value_traded_kr:
-                continue
+def delta_path_for(path: str) -> str:
+    # data/watchlist_us.json -> data/watchlist_us.delta.json
+    root, ext = os.path.splitext(path)
+    return f"{root}.delta{ext or '.json'}"
 
-            ma200 = sma(c, cfg.trend_ma)
-            if np.isnan(ma200.iloc[-1]) or not (c.iloc[-1] > ma200.iloc[-1]):
-                continue
+def watchlist_delta(prev: List[Dict], items: List[Dict]) -> Dict:
+    prev_syms = {x["symbol"] for x in prev}
+    new_syms = {x["symbol"] for x in items}
+    return {
+        "added": [x for x in items if x["symbol"] not in prev_syms],
+        "removed": sorted(prev_syms - new_syms),
+    }
 
-            if cfg.use_50_200_filter:
-                ma50 = sma(c, 50)
-                if np.isnan(ma50.iloc[-1]) or not (ma50.iloc[-1] > ma200.iloc[-1]):
-                    continue
+def _write_json_atomic(path: str, obj):
+    # 같은 디렉터리에 임시 파일로 쓴 뒤 교체 -> 읽는 쪽(intraday 루프)이 반쯤 쓴 파일을 보지 않음
+    d = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
-            r126 = ret_n(c, 126)
-            r63 = ret_n(c, 63)
-            if np.isnan(r126) or np.isnan(r63):
-                continue
+def save_watchlist(path: str, items: List[Dict], delta_path: Optional[str] = None) -> Dict:
+    """
+    전체 watchlist 저장 + 직전 목록 대비 delta(추가/제거) 저장
+    - 전체 목록 파일 형식은 그대로 (list)
+    - delta 파일: {"version", "base_version", "added", "removed"}
+      base_version이 내가 가진 version과 다르면 delta 대신 전체 목록을 다시 읽어야 함
+    """
+    delta_path = delta_path or delta_path_for(path)
 
-            score = cfg.mom_w_126 * r126 + cfg.mom_w_63 * r63
+    prev: List[Dict] = []
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                prev = json.load(f)
+        except Exception:
+            prev = []
 
-            rows.append({
-                "symbol": sym,
-                "price": price,
-                "liquidity": vt,
-                "ret_126": r126,
-                "ret_63": r63,
-                "score": score,
-                "source": "KOSPI200",
-            })
+    base_version = None
+    if os.path.exists(delta_path):
+        try:
+            with open(delta_path, "r", encoding="utf-8") as f:
+                base_version = json.load(f).get("version")
+        except Exception:
+            base_version = None
 
-        if not rows:
-            return []
-        out = pd.DataFrame(rows).sort_values(["score", "liquidity"], ascending=[False, False]).head(cfg.top_n_kr)
-        return out.to_dict(orient="records")
+    delta = watchlist_delta(prev, items)
+    delta["version"] = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    delta["base_version"] = base_version
 
-def save_watchlist(path: str, items: List[Dict]):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+    # 전체 목록을 먼저 쓰고 delta를 나중에 써야 version이 보이는 시점에 목록도 최신
+    _write_json_atomic(path, items)
+    _write_json_atomic(delta_path, delta)
+    return delta